@@ -1,3 +1,3 @@
 from .version import __version__
 from .amcsd import get_amcsd
-from .cif_cluster import cif_cluster, cif2feffinp, read_cif_structure
+from .cif_cluster import cif_cluster, cif2feffinp, cif2feffinp_batch, read_cif_structure
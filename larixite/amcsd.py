@@ -53,6 +53,7 @@ from .xrd_utils import generate_hkl, hkl2d, q2twotheta, wavelength2energy
 
 
 _CIFDB = None
+_CIFDB_TRIM = None
 ALL_HKLS = None
 AMCSD_TRIM = 'amcsd_cif1.db'
 AMCSD_FULL = 'amcsd_cif2.db'
@@ -572,10 +573,10 @@ class CifStructure():
         if pstruct is None:
             print(f"pymatgen could not parse CIF structure for CIF {self.ams_id}")
             return
-        pdict = pstruct.as_dict()
+        lattice = pstruct.lattice
         unitcell = {}
         for a in ('a', 'b', 'c', 'alpha', 'beta', 'gamma', 'volume'):
-            unitcell[a] = pdict['lattice'][a]
+            unitcell[a] = getattr(lattice, a)
         return unitcell
 
     def get_sites(self):
@@ -588,11 +589,9 @@ class CifStructure():
 
         sites = {}
         for site in pstruct.sites:
-            sdat = site.as_dict()
-            fcoords = sdat['abc']
-
-            for spec in sdat['species']:
-                elem = spec['element']
+            fcoords = site.frac_coords
+            for spec, occu in site.species.items():
+                elem = spec.symbol
                 if elem == 'Nh': elem = 'N'
                 if elem == 'Og':
                     elem = 'O'
@@ -602,7 +601,6 @@ class CifStructure():
                     elem = 'H'
                 if elem == 'Fl':
                     elem = 'F'
-                occu = spec['occu']
                 if elem not in sites:
                     sites[elem] = [(occu, fcoords)]
                 else:
@@ -1277,7 +1275,7 @@ def get_amcsd(download_full=True, timeout=30):
     Example:
 
     """
-    global _CIFDB
+    global _CIFDB, _CIFDB_TRIM
     if _CIFDB is not None:
         return _CIFDB
 
@@ -1303,8 +1301,11 @@ def get_amcsd(download_full=True, timeout=30):
             time.sleep(0.25)
             _CIFDB = AMCSD(dbfull)
             return _CIFDB
-    # finally download of full must have failed
-    return AMCSD()
+    # finally download of full must have failed: use the trimmed database,
+    # opened only once
+    if _CIFDB_TRIM is None:
+        _CIFDB_TRIM = AMCSD()
+    return _CIFDB_TRIM
 
 def get_cif(ams_id):
     """
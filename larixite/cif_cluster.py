@@ -1,6 +1,7 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from random import Random
 from io import StringIO
 import numpy as np
 from pymatgen.core import __version__ as pymatgen_version
@@ -9,14 +10,28 @@ from xraydb import atomic_symbol, atomic_number, xray_edge
 
 from .utils import strict_ascii, fcompact, isotime
 from .amcsd_utils import PMG_CIF_OPTS, CifParser, Molecule, SpacegroupAnalyzer
+from . import amcsd
 from .amcsd import get_cif
 
 from .version import __version__ as x_version
 
-rng = Random()
+# larixite version written to input files, without any '.post' suffix
+LARIXITE_VERSION = x_version.split('.post')[0]
+
+rng = np.random.default_rng()
 
 TEMPLATE_FOLDER = Path(Path(__file__).parent, 'templates')
 
+@lru_cache(maxsize=32)
+def _load_template(path, mtime):
+    "read text of a template file, cached by path and modification time"
+    return Path(path).read_text()
+
+def read_template(name):
+    "read text of a template file in TEMPLATE_FOLDER, re-read only if modified"
+    path = Path(TEMPLATE_FOLDER, name)
+    return _load_template(path, path.stat().st_mtime)
+
 
 def read_cif_structure(ciftext):
     """read CIF text, return CIF Structure
@@ -47,15 +62,55 @@ def read_cif_structure(ciftext):
     return cstruct
 
 
+def read_cif_symmetry(ciftext):
+    """read CIF text or file, return CIF Structure, symmetrized Structure
+    and space group
+
+    The symmetry analysis is expensive, so results are cached on the CIF
+    text (read from the file for a file name, so that a changed file is
+    parsed again). The returned structures are shared, and should not be
+    modified.
+    """
+    if os.path.exists(ciftext):
+        with open(ciftext, 'r') as fh:
+            ciftext = fh.read()
+    return _read_cif_symmetry(ciftext)
+
+@lru_cache(maxsize=64)
+def _read_cif_symmetry(ciftext):
+    "cached parsing and symmetry analysis of CIF text, for read_cif_symmetry"
+    struct = read_cif_structure(ciftext)
+    sga = SpacegroupAnalyzer(struct)
+    space_group = sga.get_symmetry_dataset().international
+    return struct, sga.get_symmetrized_structure(), space_group
+
+
 def site_label(site):
     coords = ','.join([fcompact(s) for s in site.frac_coords])
     return f'{site.species_string}[{coords}]'
 
+def site_labels(sites, species_strings=None):
+    """list of site labels for a list of sites, as from site_label(),
+    formatting all fractional coordinates at once.  species_strings,
+    if given, is the list of site.species_string for the sites"""
+    if len(sites) == 0:
+        return []
+    if species_strings is None:
+        species_strings = [site.species_string for site in sites]
+    coords = np.array([site.frac_coords for site in sites])
+    coords = np.char.rstrip(np.char.mod('%.6f', coords), '0')
+    coords = np.where(np.char.endswith(coords, '.'), np.char.add(coords, '0'), coords)
+    return [f"{species}[{','.join(fc)}]"
+            for species, fc in zip(species_strings, coords.tolist())]
+
 class CIF_Cluster():
     """
     CIF structure for generating clusters around a specific crystal site,
     as used for XAS calculations
 
+    Note that struct, sym_struct, and the sites in unique_sites are
+    shared by all CIF_Clusters made from the same CIF text, as parsing
+    is cached: they should not be modified.
     """
     def __init__(self, ciftext=None, filename=None, absorber=None,
                  absorber_site=1, with_h=False, cluster_size=8.0):
@@ -66,6 +121,8 @@ class CIF_Cluster():
         self.with_h = with_h
         self.cluster_size = cluster_size
         self.struct = None
+        self.sym_struct = None
+        self._molecule = None
 
         if isinstance(self.absorber, int):
             self.absorber   = atomic_symbol(self.absorber)
@@ -91,16 +148,19 @@ class CIF_Cluster():
             self.set_absorber(absorber)
         if ciftext is not None:
             self.ciftext = ciftext
-        self.struct = read_cif_structure(self.ciftext)
+        self.struct, self.sym_struct, self.space_group = read_cif_symmetry(self.ciftext)
         self.get_cif_sites()
 
     def get_cif_sites(self):
         """parse sites of CIF structure to get several components:
 
            struct.sites:   list of all sites as parsed by pymatgen
+           species_strings: list of species strings for all sites
+           frac_coords:    array of fractional coordinates for all sites
            site_labels:    list of site labels
            unique_sites:   list of (site[0], wyckoff sym) for unique xtal sites
            unique_map:     mapping of all site_labels to unique_site index
+           site_unique:    unique_site index for each site of struct
            absorber_sites: list of unique sites with absorber
 
         """
@@ -108,33 +168,40 @@ class CIF_Cluster():
         # and list of site indexes with absorber
 
         self.formula = self.struct.composition.reduced_formula
-        sga = SpacegroupAnalyzer(self.struct)
-        self.space_group = sga.get_symmetry_dataset().international
-
-        sym_struct = sga.get_symmetrized_structure()
+        sym_struct = self.sym_struct
         wyckoff_symbols = sym_struct.wyckoff_symbols
 
-        self.site_labels = []
-        for site in self.struct.sites:
-            self.site_labels.append(site_label(site))
+        self.species_strings = [site.species_string for site in self.struct.sites]
+        self.frac_coords = self.struct.frac_coords
+        self.site_labels = site_labels(self.struct.sites, self.species_strings)
 
+        # the symmetrized structure keeps the site order of struct, so
+        # equivalent_indices map all sites to unique sites in one pass,
+        # and the site labels need to be formatted only once
         self.unique_sites = []
         self.unique_map = {}
-        self.absorber_sites = []
-        absorber = '~'*30 if self.absorber is None else self.absorber
-        for i, sites in enumerate(sym_struct.equivalent_sites):
+        self.site_unique = np.zeros(len(self.struct), dtype=int)
+        unique_labels = []
+        for i, (sites, indices) in enumerate(zip(sym_struct.equivalent_sites,
+                                                 sym_struct.equivalent_indices)):
             self.unique_sites.append((sites[0], len(sites), wyckoff_symbols[i]))
-            for site in sites:
-                self.unique_map[site_label(site)] = (i+1)
-            if absorber in site.species_string:
-                self.absorber_sites.append(i)
+            unique_labels.append(self.site_labels[indices[0]])
+            for j in indices:
+                self.unique_map[self.site_labels[j]] = (i+1)
+            self.site_unique[indices] = i+1
+
+        # element symbols of each unique site, so that the absorber test
+        # does not match, say, 'C' in 'Ca'
+        site_elems = [{e.symbol for e in dat[0].species} for dat in self.unique_sites]
+        self.absorber_sites = [i for i, elems in enumerate(site_elems)
+                               if self.absorber in elems]
 
         self.atom_sites = {}
         self.atom_site_labels = {}
 
         for i, dat in enumerate(self.unique_sites):
             site = dat[0]
-            label = site_label(site)
+            label = unique_labels[i]
             for species in site.species:
                 elem = species.name
                 if elem in self.atom_sites:
@@ -163,46 +230,69 @@ class CIF_Cluster():
 
         csize2 = cluster_size**2
 
-        site_atoms = {}  # map xtal site with list of atoms occupying that site
+        site_atoms = {}  # map xtal site with the atom occupying that site
+        site_occupancy = {}  # map partially occupied site to (species, probabilities)
         site_tags = {}
 
         for i, site in enumerate(self.struct.sites):
-            label = site_label(site)
-            s_unique = self.unique_map.get(label, 0)
-            site_species = [e.symbol for e in site.species]
-            if len(site_species) > 1:
-                s_els = [s.symbol for s in site.species.keys()]
-
-                s_wts = [s for s in site.species.values()]
-                site_atoms[i] = rng.choices(s_els, weights=s_wts, k=1000)
-                site_tags[i] = f'({site.species_string:s})_{s_unique:d}'
+            s_unique = self.site_unique[i]
+            species = site.species
+            species_string = self.species_strings[i]
+            s_els = [e.symbol for e in species]
+            if len(s_els) > 1:
+                s_wts = np.array(list(species.values()))
+                site_occupancy[i] = (s_els, s_wts/s_wts.sum())
+                site_tags[i] = f'({species_string:s})_{s_unique:d}'
             else:
-                site_atoms[i] = [site_species[0]] * 1000
-                site_tags[i] = f'{site.species_string:s}_{s_unique:d}'
+                site_atoms[i] = s_els[0]
+                site_tags[i] = f'{species_string:s}_{s_unique:d}'
 
         # atom0 = self.struct[a_index]
         atom0 = self.unique_sites[absorber_site-1][0]
-        sphere = self.struct.get_neighbors(atom0, self.cluster_size)
-
-        self.symbols = [self.absorber]
-        self.coords = [[0, 0, 0]]
-        site0_species = [e.symbol for e in atom0.species]
-        if len(site0_species) > 1:
-            self.tags = [f'({atom0.species_string})_{absorber_site:d}']
+        origin = atom0.coords
+        lattice = self.struct.lattice
+        fcoords, dists, s_indices, _ = lattice.get_points_in_sphere(self.frac_coords,
+                                                                   origin, cluster_size,
+                                                                   zip_results=False)
+
+        if len(atom0.species) > 1:
+            tag0 = f'({atom0.species_string})_{absorber_site:d}'
         else:
-            self.tags = [f'{atom0.species_string}_{absorber_site:d}']
+            tag0 = f'{atom0.species_string}_{absorber_site:d}'
+
+        # neighbor distances from get_points_in_sphere, masked to cluster
+        # size at once, excluding the absorbing atom itself
+        inside = np.nonzero((dists > 1.e-8) & (dists*dists < csize2))[0]
+        coords = lattice.get_cartesian_coords(fcoords.reshape(-1, 3)[inside]) - origin
+
+        # absorber at origin, followed by the atoms inside the cluster
+        natoms = len(inside) + 1
+        self.coords = np.zeros((natoms, 3))
+        self.coords[1:] = coords
+        self.symbols = [self.absorber]*natoms
+        self.tags = [tag0]*natoms
+        site_members = {}  # cluster atoms on each partially occupied site
+        for iat, s_index in enumerate(s_indices[inside], start=1):
+            if s_index in site_occupancy:
+                site_members.setdefault(s_index, []).append(iat)
+            else:
+                self.symbols[iat] = site_atoms[s_index]
+            self.tags[iat] = site_tags[s_index]
 
-        for i, site_dist in enumerate(sphere):
-            s_index = site_dist[0].index
-            site_symbol = site_atoms[s_index].pop()
+        # draw species for all cluster atoms of a partially occupied site at once
+        for s_index, iats in site_members.items():
+            s_els, s_probs = site_occupancy[s_index]
+            for iat, sym in zip(iats, rng.choice(s_els, size=len(iats), p=s_probs).tolist()):
+                self.symbols[iat] = sym
 
-            coords = site_dist[0].coords - atom0.coords
-            if (coords[0]**2 + coords[1]**2  + coords[2]**2) < csize2:
-                self.tags.append(site_tags[s_index])
-                self.symbols.append(site_symbol)
-                self.coords.append(coords)
+        self._molecule = None
 
-        self.molecule = Molecule(self.symbols, self.coords)
+    @property
+    def molecule(self):
+        "pymatgen Molecule for the cluster, built on first use"
+        if self._molecule is None:
+            self._molecule = Molecule(self.symbols, self.coords)
+        return self._molecule
 
 
 def cif_cluster(ciftext=None, filename=None, absorber=None):
@@ -213,10 +303,16 @@ def cif_cluster(ciftext=None, filename=None, absorber=None):
 def cif_extra_titles(cifid):
     """get 'extra titles' from AMCSD cif id"""
     try:
-        cif = get_cif(cifid)
+        return list(_cif_extra_titles(cifid))
     except:
         return []
 
+@lru_cache(maxsize=256)
+def _cif_extra_titles(cifid):
+    """cached 'extra titles' for cif_extra_titles: failed lookups raise,
+    and so are not cached"""
+    cif = get_cif(cifid)
+
     # titles from CIF
     out = [f'Mineral Name: {cif.mineral.name.lower()}',
            f'CIF Source: AmMin Crystal Structure DB, id={cif.ams_id}']
@@ -281,10 +377,10 @@ def cif2feffinp(ciftext, absorber, template=None, edge=None, cluster_size=8.0,
     """
     global rng
     if rng_seed is not None:
-        rng.seed(rng_seed)
+        rng = np.random.default_rng(rng_seed)
 
     if template is None:
-        template = open(Path(TEMPLATE_FOLDER, 'feff_exafs.tmpl'), 'r').read()
+        template = read_template('feff_exafs.tmpl')
 
     cluster = CIF_Cluster(ciftext=ciftext, absorber=absorber)
 
@@ -293,8 +389,6 @@ def cif2feffinp(ciftext, absorber, template=None, edge=None, cluster_size=8.0,
 
     cluster.build_cluster(absorber_site=absorber_site, cluster_size=cluster_size)
 
-    mol = cluster.molecule
-
     absorber = cluster.absorber
     absorber_z = cluster.absorber_z
     if edge is None:
@@ -303,15 +397,12 @@ def cif2feffinp(ciftext, absorber, template=None, edge=None, cluster_size=8.0,
     edge_energy = xray_edge(absorber, edge).energy
     edge_comment = f'{absorber:s} {edge:s} edge, around {edge_energy:.0f} eV'
 
-    unique_pot_atoms = []
+    unique_pot_atoms = {}
     for site in cluster.struct:
         for elem in site.species.elements:
-            if elem.symbol not in unique_pot_atoms:
-                unique_pot_atoms.append(elem.symbol)
+            unique_pot_atoms.setdefault(elem.symbol, None)
 
-    atoms_map = {}
-    for i, atom in enumerate(unique_pot_atoms):
-        atoms_map[atom] = i + 1
+    atoms_map = {atom: i+1 for i, atom in enumerate(unique_pot_atoms)}
 
     if absorber not in atoms_map:
         atlist = ', '.join(atoms_map.keys())
@@ -349,9 +440,10 @@ def cif2feffinp(ciftext, absorber, template=None, edge=None, cluster_size=8.0,
     ipot_lines = []
     ipot_map = {}
     next_ipot = 0
-    at_lines = [(0, mol[0].x, mol[0].y, mol[0].z, 0, absorber, cluster.tags[0])]
-    for i, site in enumerate(mol[1:]):
-        sym = site.species_string
+    coords = cluster.coords
+    at_lines = [(0, *coords[0], 0, absorber, cluster.tags[0])]
+    mol_dists = np.linalg.norm(coords[1:] - coords[0], axis=1)
+    for i, sym in enumerate(cluster.symbols[1:]):
         if sym == 'H' and not with_h:
             continue
         if sym in ipot_map:
@@ -360,8 +452,8 @@ def cif2feffinp(ciftext, absorber, template=None, edge=None, cluster_size=8.0,
             next_ipot += 1
             ipot_map[sym] = ipot = next_ipot
 
-        dist = mol.get_distance(0, i+1)
-        at_lines.append((dist, site.x, site.y, site.z, ipot, sym, cluster.tags[i+1]))
+        dist = mol_dists[i]
+        at_lines.append((dist, *coords[i+1], ipot, sym, cluster.tags[i+1]))
 
     if len(ipot_map) > 10:
         comments.append('*** WARNING: Feff 8l is limited to 11 unique potentials***')
@@ -370,27 +462,21 @@ def cif2feffinp(ciftext, absorber, template=None, edge=None, cluster_size=8.0,
     # ipots
     ipot, z = 0, absorber_z
     ipot_lines = [f'  {ipot:4d}  {z:>4d}   {absorber:>3s}']
+    z_of = {sym: atomic_number(sym) for sym in ipot_map}
     for sym, ipot in ipot_map.items():
-        z = atomic_number(sym)
-        ipot_lines.append(f'  {ipot:4d}  {z:>4d}   {sym:>3s}')
+        ipot_lines.append(f'  {ipot:4d}  {z_of[sym]:>4d}   {sym:>3s}')
 
-    # ordered atoms list
-    acount = 0
+    # ordered atoms list, limited to 500 atoms
+    atom_line = '  {: .5f}  {: .5f}  {: .5f} {:2d}  {:>3s}  {:.5f}  * {:s}'.format
     atoms = []
-    for dist, x, y, z, ipot, sym, tag in sorted(at_lines, key=lambda x: x[0]):
-        acount += 1
-        if acount > 500:
-            break
-        sym = (sym + ' ')[:2]
-        xyzi = f'  {x:+.5f}  {y:+.5f}  {z:+.5f} {ipot:2d}'.replace(' +', '  ')
-        atoms.append(f'{xyzi}  {sym:>3s}  {dist:.5f}  * {tag:s}')
+    dists = np.array([at[0] for at in at_lines])
+    for iat in np.argsort(dists, kind='stable')[:500]:
+        dist, x, y, z, ipot, sym, tag = at_lines[iat]
+        atoms.append(atom_line(x, y, z, ipot, (sym + ' ')[:2], dist, tag))
 
 
     # now ready to write with template
-    vers = x_version[:]
-    if '.post' in vers:
-        vers = vers.split('.post')[0]
-    conf = {'version': vers, 'timestamp': isotime(),
+    conf = {'version': LARIXITE_VERSION, 'timestamp': isotime(),
             'pymatgen_version': pymatgen_version, 'edge': edge,
             'radius': f'{cluster_size:.2f}' }
 
@@ -400,3 +486,37 @@ def cif2feffinp(ciftext, absorber, template=None, edge=None, cluster_size=8.0,
     conf['atoms'] = '\n'.join(atoms)
 
     return strict_ascii(template.format(**conf))
+
+
+def _batch_worker_init():
+    "initialize a worker process for cif2feffinp_batch"
+    global rng
+    # workers forked from the parent would otherwise share its RNG state
+    # and its database connections: each worker opens its own database
+    rng = np.random.default_rng()
+    amcsd._CIFDB = amcsd._CIFDB_TRIM = None
+
+def _one(job):
+    "run cif2feffinp for one job of cif2feffinp_batch"
+    if isinstance(job, dict):
+        return cif2feffinp(**job)
+    return cif2feffinp(*job)
+
+def cif2feffinp_batch(jobs, workers=None):
+    """convert many CIFs and absorbers to Feff input files, in parallel
+
+    Arguments
+    ---------
+      jobs (list):            list of jobs, each a tuple of positional arguments
+                              or a dict of keyword arguments for cif2feffinp
+      workers (int or None):  number of worker processes [None, for os.cpu_count()]
+    Returns
+    -------
+      list of texts of Feff input files, in the order of jobs
+
+    Notes
+    -----
+      to get reproducible occupancy selections, give `rng_seed` for each job.
+    """
+    with ProcessPoolExecutor(workers, initializer=_batch_worker_init) as ex:
+        return list(ex.map(_one, jobs))
@@ -3,6 +3,7 @@
 site configuration
 """
 import os
+import re
 import sys
 import time
 from pathlib import Path
@@ -13,10 +14,14 @@ from pyshortcuts import get_homedir, bytes2str, isotime
 home_dir = get_homedir()
 user_folder = Path(home_dir, '.larch').absolute().as_posix()
 
+NON_ASCII = re.compile('[^\x00-\x7f]')
+
 def strict_ascii(s, replacement='_'):
     """for string to be truly ASCII with all characters below 128"""
-    t = bytes(s, 'UTF-8')
-    return ''.join([chr(a) if a < 128 else replacement for a in t])
+    if s.isascii():
+        return s
+    # replace each UTF-8 byte of non-ASCII characters
+    return NON_ASCII.sub(lambda m: replacement*len(m.group().encode('UTF-8')), s)
 
 
 def mkdir(name, mode=0o775):
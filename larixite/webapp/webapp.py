@@ -2,14 +2,17 @@
 import os
 import time
 import numpy as np
+from copy import deepcopy
 from pathlib import Path
+from uuid import uuid4
 
 from flask import (Flask, redirect, url_for, render_template, flash,
                    request, session, Response, send_from_directory)
 from werkzeug.utils import secure_filename
+from flask_caching import Cache
 
 from larixite import get_amcsd, cif_cluster, cif2feffinp, read_cif_structure
-from larixite.utils import get_homedir
+from larixite.utils import get_homedir, user_folder
 
 from xraydb import atomic_number
 from xraydb.chemparser import chemparse
@@ -30,25 +33,84 @@ app.secret_key = 'persuasive butternut lanterns'
 
 app.config.from_object(__name__)
 
-cifdb = config = None
-
-def connect(session, clear=False, cifid=None):
-    global cifdb, config
+# the cache lives on disk so that it is shared by all worker processes.
+# cached values are pickled, so the folders the app keeps them in must be
+# private to this user.  CACHE_DIR itself is created if needed, but an
+# existing folder is left as it is.
+CACHE_DIR = os.environ.get('LARIXITE_CACHE_DIR',
+                           Path(user_folder, 'larixite_webcache').as_posix())
+
+def private_folder(name):
+    "create a folder only this user can use, or check an existing one"
+    path = Path(name)
+    if not path.exists():
+        os.makedirs(path, mode=0o700)
+    elif not path.is_dir():
+        raise FileExistsError(f"'{name}' is a file, cannot use it as a cache folder")
+    elif hasattr(os, 'getuid') and path.stat().st_uid != os.getuid():
+        raise PermissionError(f"cache folder '{name}' is not owned by this user")
+    os.chmod(path, 0o700)
+    return path.as_posix()
+
+if not Path(CACHE_DIR).exists():
+    os.makedirs(CACHE_DIR, mode=0o700)
+
+cache = Cache(app, config={'CACHE_TYPE': 'FileSystemCache',
+                           'CACHE_DIR': private_folder(Path(CACHE_DIR, 'cache')),
+                           'CACHE_DEFAULT_TIMEOUT': 600})
+
+cache = Cache(app, config={'CACHE_TYPE': 'FileSystemCache',
+                           'CACHE_DIR': Path(CACHE_DIR, 'cache').as_posix(),
+                           'CACHE_DEFAULT_TIMEOUT': 600})
+
+# per-session configuration is held server-side in its own store, keyed by
+# a session id stored in the session cookie, so that cached searches and
+# CIF texts never push out live sessions
+SESSION_TIMEOUT = 4*3600
+SESSION_THRESHOLD = 20000
+sessions = Cache(app, config={'CACHE_TYPE': 'FileSystemCache',
+                              'CACHE_DIR': private_folder(Path(CACHE_DIR, 'sessions')),
+                              'CACHE_THRESHOLD': SESSION_THRESHOLD,
+                              'CACHE_DEFAULT_TIMEOUT': SESSION_TIMEOUT})
+CONFIG_DEFAULTS = {'cifdict': {},
+                   'with_h': 0,
+                   'edges': ['K', 'L3', 'L2', 'L1', 'M5', 'M4', 'M3'],
+                   'cluster_size': 7.0,
+                   'mineral': '',
+                   'elems_in': '',
+                   'elems_out': '',
+                   'strict': True,
+                   'absorber': '',
+                   'edge': '',
+                   'ciftext': ''}
+
+cifdb = None
+
+def get_cifdb():
+    "CIF database, opened on first use"
+    global cifdb
     if cifdb is None:
         cifdb = get_amcsd()
-
-    if config is None or clear:
-        config = {'cifdict': {},
-                  'with_h': 0,
-                  'edges': ['K', 'L3', 'L2', 'L1', 'M5', 'M4', 'M3'],
-                  'cluster_size': 7.0,
-                  'mineral': '',
-                  'elems_in': '',
-                  'elems_out': '',
-                  'strict': True,
-                  'absorber': '',
-                  'edge': '',
-                  'ciftext': ''}
+    return cifdb
+
+def get_config(clear=False):
+    "get configuration for the current session"
+    if 'sid' not in session:
+        session['sid'] = uuid4().hex
+    config = None
+    if not clear:
+        config = sessions.get(f"config_{session['sid']}")
+    if config is None:
+        config = deepcopy(CONFIG_DEFAULTS)
+    return config
+
+def save_config(config):
+    "save configuration for the current session"
+    sessions.set(f"config_{session['sid']}", config)
+
+def connect(clear=False, cifid=None):
+    "return session configuration, loading CIF text for cifid"
+    config = get_config(clear=clear)
 
     if cifid is None:
         mode = 'browse'
@@ -66,8 +128,7 @@ def connect(session, clear=False, cifid=None):
 
     if mode == 'amsid':
         config['cifid'] = int(cifid)
-        cif = cifdb.get_cif(cifid)
-        config['ciftext'] = cif.ciftext.strip()
+        config['ciftext'] = get_ciftext(cifid)
         config['ciffile'] = ''
     elif mode == 'file':
         config['cifid'] = cifid
@@ -79,6 +140,46 @@ def connect(session, clear=False, cifid=None):
                     config['ciftext'] = fh.read().strip()
         except:
             pass
+    return config
+
+@cache.memoize(3600)
+def get_ciftext(cifid):
+    "text of CIF for an AMCSD id"
+    return get_cifdb().get_cif(cifid).ciftext.strip()
+
+@cache.memoize(600)
+def search_cifs(mineral, elems_in, elems_out, strict):
+    "search AMCSD, returning dict of {cifid: (label, citation)}"
+    if len(mineral) > 2 and not mineral.endswith('*'):
+        mineral = mineral + '*'
+
+    contains_elements = excludes_elements = None
+    if len(elems_in) >  0:
+        contains_elements = [a.strip().title() for a in elems_in.split(',')]
+    if len(elems_out) >  0:
+        excludes_elements = [a.strip().title() for a in elems_out.split(',')]
+
+    cifdict = {}
+    all_cifs = get_cifdb().find_cifs(mineral_name=mineral,
+                               contains_elements=contains_elements,
+                               excludes_elements=excludes_elements,
+                               strict_contains=strict, max_matches=500)
+
+    for cif in all_cifs:
+        try:
+            label = cif.formula.replace(' ', '')
+            mineral = cif.get_mineralname()
+            year = cif.publication.year
+            journal= cif.publication.journalname
+            cid = cif.ams_id
+            label = f'{label}: {mineral}'
+            cite = f'{journal} {year}'
+            if len(label) > 80 and len(cifdict) > 125:
+                continue
+            cifdict[cid] = (label, cite)
+        except:
+            pass
+    return cifdict
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -94,8 +195,7 @@ def favicon():
 @app.route('/cifs', methods=['GET', 'POST'])
 @app.route('/cifs/<cifid>', methods=['GET', 'POST'])
 def cifs(cifid=None):
-    global cifdb, config
-    connect(session, clear=False, cifid=cifid)
+    config = connect(clear=False, cifid=cifid)
 
     if len(config['ciftext']) > 4:
         config['ciftext'] = '\n\n' + config['ciftext']
@@ -103,7 +203,7 @@ def cifs(cifid=None):
         try:
             t = read_cif_structure(config['ciftext'])
         except ValueError:
-            error = f"could not read CIF:   {conf['cifid']}"
+            error = f"could not read CIF:   {config['cifid']}"
             return render_template('index.html',
                             error=error)
         cluster = cif_cluster(config['ciftext'])
@@ -124,35 +224,7 @@ def cifs(cifid=None):
             strict = request.form.get('strict') is not None
             config.update({'elems_in': elems_in, 'elems_out': elems_out,
                            'mineral': mineral, 'strict': strict})
-            if len(mineral) > 2 and not mineral.endswith('*'):
-                mineral = mineral + '*'
-
-            contains_elements = excludes_elements = None
-            if len(elems_in) >  0:
-                contains_elements = [a.strip().title() for a in elems_in.split(',')]
-            if len(elems_out) >  0:
-                excludes_elements = [a.strip().title() for a in elems_out.split(',')]
-
-            cifdict = {}
-            all_cifs = cifdb.find_cifs(mineral_name=mineral,
-                                       contains_elements=contains_elements,
-                                       excludes_elements=excludes_elements,
-                                       strict_contains=strict, max_matches=500)
-
-            for cif in all_cifs:
-                try:
-                    label = cif.formula.replace(' ', '')
-                    mineral = cif.get_mineralname()
-                    year = cif.publication.year
-                    journal= cif.publication.journalname
-                    cid = cif.ams_id
-                    label = f'{label}: {mineral}'
-                    cite = f'{journal} {year}'
-                    if len(label) > 80 and len(cifict) > 125:
-                        continue
-                    cifdict[cid] = (label, cite)
-                except:
-                    pass
+            cifdict = search_cifs(mineral, elems_in, elems_out, strict)
             config['cifdict'] = cifdict
             config['cifid'] = cifid  = None
             config['ciftext'] = ''
@@ -184,21 +256,22 @@ def cifs(cifid=None):
                     config['feff_links'][link] = (slabel, cifid, absorber, edge, sindex,
                                                   cluster_size, with_h)
 
+    save_config(config)
     return render_template('index.html', **config)
 
 
 @app.route('/')
 def index():
-    global cifdb, config
-    connect(session, clear=True)
+    config = connect(clear=True)
+    save_config(config)
     return render_template('index.html', **config)
 
 
 @app.route('/feffinp/<cifid>/<absorber>/<site>/<edge>/<cluster_size>/<with_h>/<fname>')
 def feffinp(cifid=None, absorber=None, site=1, edge='K', cluster_size=7.0,
             with_h=False, fname=None):
-    connect(session, cifid=cifid)
-    global cifdb, config
+    config = connect(cifid=cifid)
+    save_config(config)
     if absorber.startswith('Wat'):
         absorber.replace('Wat', 'O')
     if absorber.startswith('O-H'):
@@ -239,8 +312,8 @@ def feffinp(cifid=None, absorber=None, site=1, edge='K', cluster_size=7.0,
 
 @app.route('/ciffile/<cifid>/<fname>')
 def ciffile(cifid=None, fname='amcsd.cif'):
-    global cifdb, config
-    connect(session, cifid=cifid)
+    config = connect(cifid=cifid)
+    save_config(config)
     return Response(config['ciftext'], mimetype='text/plain')
 
 @app.route('/upload/')
@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-from xstructures.webapp import app
+from larixite.webapp import app
 
 app.jinja_env.cache = {}
 app.run(debug=True, port=11564)
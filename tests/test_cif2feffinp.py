@@ -1,6 +1,7 @@
 import pytest
 
-from larixite import get_amcsd, cif2feffinp
+from larixite import get_amcsd, cif2feffinp, cif2feffinp_batch
+from larixite.amcsd import AMCSD
 
 def test_cif2feff_v1():
 
@@ -19,5 +20,32 @@ def test_cif2feff_v1():
                                    with_h=with_h)
                 assert len(text) > 2000
 
+def test_cif2feff_batch():
+
+    # the trimmed AMCSD database included with larixite, so that this
+    # test runs without downloading the full database.  CIF 23 has
+    # partially occupied sites, so rng_seed must give the same draws
+    db = AMCSD(read_only=True)
+    cifids = {23: ('Al', 'Na'),
+              143: ('Fe', 'O')}
+
+    jobs = []
+    for cifid, atoms in cifids.items():
+        cif = db.get_cif(cifid)
+        for absorber in atoms:
+            jobs.append({'ciftext': cif.ciftext, 'absorber': absorber,
+                         'cluster_size': 6, 'rng_seed': 1})
+    # titles from the database, read in the worker process
+    jobs[-1]['cifid'] = 143
+
+    texts = cif2feffinp_batch(jobs, workers=2)
+    assert len(texts) == len(jobs)
+    assert 'TITLE Mineral Name: hematite' in texts[-1]
+    for job, text in zip(jobs, texts):
+        # drop the line with the timestamp
+        expected = cif2feffinp(**job).split('\n')[1:]
+        assert text.split('\n')[1:] == expected
+
 if __name__ == '__main__':
     test_cif2feff_v1()
+    test_cif2feff_batch()
@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+
+from larixite.amcsd import AMCSD
+from larixite.cif_cluster import CIF_Cluster
+
+# the trimmed AMCSD database included with larixite, so that these
+# tests run without downloading the full database
+db = AMCSD(read_only=True)
+
+def test_cif_file_reread(tmp_path):
+    ciffile = tmp_path / 'test.cif'
+
+    ciffile.write_text(db.get_cif(143).ciftext)
+    cluster = CIF_Cluster(ciftext=str(ciffile))
+    assert cluster.formula == 'Fe2O3'
+
+    # a changed file must be parsed again
+    ciffile.write_text(db.get_cif(89).ciftext)
+    cluster = CIF_Cluster(ciftext=str(ciffile), absorber='Zn')
+    assert cluster.formula == 'ZnS'
+    assert 'Zn' in cluster.atom_sites
+
+def test_cluster_larger_than_default():
+    cluster = CIF_Cluster(ciftext=db.get_cif(143).ciftext, absorber='Fe')
+    cluster.build_cluster(absorber_site=1, cluster_size=10.0)
+
+    dists = np.linalg.norm(cluster.coords, axis=1)
+    assert dists[0] == 0
+    assert 8.0 < dists[1:].max() < 10.0
+
+    # same atoms as a direct search of the structure around the absorber
+    origin = cluster.unique_sites[0][0].coords
+    neighbors = cluster.struct.get_sites_in_sphere(origin, 10.0)
+    assert len(cluster.coords) == len(neighbors)
+
+def test_absorber_sites_match_elements():
+    # CIF 86 has Ca, Mg, C, and O sites: 'C' must not match the Ca site
+    ciftext = db.get_cif(86).ciftext
+    cluster = CIF_Cluster(ciftext=ciftext, absorber='C')
+    site_elems = [{e.symbol for e in dat[0].species} for dat in cluster.unique_sites]
+    assert site_elems == [{'Ca'}, {'Mg'}, {'C'}, {'O'}]
+    assert cluster.absorber_sites == [2]
+
+    cluster = CIF_Cluster(ciftext=ciftext, absorber='Ca')
+    assert cluster.absorber_sites == [0]
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""
+WSGI entry point for the larixite web app, for example with gunicorn:
+
+    gunicorn -w 4 --preload -b 0.0.0.0:8000 wsgi:app
+
+With --preload, the app and its imports are loaded and the CIF database
+is downloaded (if needed) once, before the worker processes are forked.
+"""
+from larixite import amcsd
+from larixite.webapp import app, webapp
+
+cifdb = webapp.get_cifdb()
+
+# forked workers must not share sqlite connections with this process:
+# close the database here, and let each worker open it on first use
+cifdb.close()
+cifdb.finalize_amcsd()
+cifdb.engine.dispose()
+webapp.cifdb = amcsd._CIFDB = amcsd._CIFDB_TRIM = cifdb = None